@@ -1,7 +1,57 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 import re
+import sys
+from bisect import insort
 from datetime import datetime
+from functools import lru_cache
+
+# Energy log commands, looked up by the second token of a raw energy log
+_TURN_OFF_COMMAND = 0
+_DELTA_COMMAND = 1
+_ENERGY_LOG_COMMANDS = {"TurnOff": _TURN_OFF_COMMAND, "Delta": _DELTA_COMMAND}
+
+
+def _estimate_energy_kernel(
+    timestamps, delta_consumptions, current_consumption: float, max_consumption: float
+) -> Tuple[float, float]:
+    """Estimates the energy used over arrays of log timestamps and delta
+    consumptions. Applies the same rules as EnergyConsumer.set_consumption
+    and returns the energy estimate together with the final consumption."""
+    total_energy_estimate = 0.0
+
+    for current_log in range(len(timestamps) - 1):
+        delta_change = delta_consumptions[current_log]
+        current_consumption = (
+            0.0
+            if delta_change == 0
+            else max(0.0, min(1.0, current_consumption + delta_change))
+        )
+
+        hours_elapsed_between_logs = (
+            timestamps[current_log + 1] - timestamps[current_log]
+        ) / 3600.0
+
+        total_energy_estimate += hours_elapsed_between_logs * (
+            current_consumption * max_consumption
+        )
+
+    return total_energy_estimate, current_consumption
+
+
+@lru_cache(maxsize=None)
+def _load_numba_kernel():
+    """Returns _estimate_energy_kernel compiled with Numba, or None if numba
+    is not installed. numba is only imported, and the kernel only compiled,
+    on the first call. The compiled kernel is not cached on disk, because
+    Numba's cache records the module name, which differs between running
+    core.py as a script and importing it as source.core."""
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+
+    return njit(_estimate_energy_kernel)
 
 
 class EnergyConsumptionLog:
@@ -9,29 +59,45 @@ class EnergyConsumptionLog:
     A class that represents a single energy log.
 
     Attributes:
-        `timestamp : datetime`
-            The timestamp of the energy log.\n
+        `timestamp : float`
+            The timestamp of the energy log in seconds since the Unix epoch.\n
         `delta_consumption : float`
             The change in energy consumption represented by a float (e.g. +15.15, -2.1).\n
         `turned_on : bool, default True`
             Signifies that the consumator is turned on. If False, the delta_consumption is set to 0.
     """
 
+    __slots__ = ("timestamp", "delta_consumption")
+
     def __init__(
         self,
-        timestamp: datetime,
-        delta_consumption: float = None,
+        timestamp: float,
+        delta_consumption: float = 0.0,
         turned_on: bool = True,
     ):
         self.timestamp = timestamp
 
-        if delta_consumption and turned_on:
-            self.delta_consumption = delta_consumption
+        if turned_on and delta_consumption is not None:
+            self.delta_consumption = float(delta_consumption)
         else:
-            self.delta_consumption = 0
+            self.delta_consumption = 0.0
+
+    @classmethod
+    def from_datetime(
+        cls,
+        timestamp: datetime,
+        delta_consumption: float = 0.0,
+        turned_on: bool = True,
+    ) -> "EnergyConsumptionLog":
+        """Creates an energy log from a datetime timestamp."""
+        return cls(
+            timestamp=timestamp.timestamp(),
+            delta_consumption=delta_consumption,
+            turned_on=turned_on,
+        )
 
     def __str__(self) -> str:
-        return f"{self.timestamp.timestamp()}:{self.delta_consumption}"
+        return f"{self.timestamp}:{self.delta_consumption}"
 
 
 class EnergyConsumptionLogger:
@@ -39,61 +105,207 @@ class EnergyConsumptionLogger:
     A class that logs energy consumption data.
 
     Attributes:
-        `energy_consumption_logs : Dict[str, EnergyConsumptionLog]`
-            A dictionary of raw energy consumption logs to parsed EnergyConsumptionLog objects.
+        `energy_consumption_logs : Dict[Tuple[float, float], EnergyConsumptionLog]`
+            A dictionary of (timestamp, delta_consumption) pairs to parsed EnergyConsumptionLog objects.\n
+        `chronological_log_keys : List[Tuple[float, float]]`
+            The keys of the energy consumption logs, kept sorted on insert.\n
+        `sorted_logs_cache : Optional[List[EnergyConsumptionLog]]`
+            The energy consumption logs in a chronological order. Reset whenever logs are added or cleared.
     """
 
-    ENERGY_LOG_REGEX: re.Pattern = re.compile(
-        r"(?:[>]\s)?([0-9]{,10})\s+(TurnOff|(Delta\s+([+-](?:\d+\.\d+|\d+))))"
+    # Matches never span lines, so the regex can also run over a batch of logs.
+    # The separators are any ASCII whitespace except the newline.
+    ENERGY_LOG_PATTERN: str = (
+        r"(?m)^(?:>[ \t\r\f\x0b])?([0-9]{1,10})[ \t\r\f\x0b]+"
+        r"(?:TurnOff|Delta[ \t\r\f\x0b]+([+-](?:[0-9]+\.[0-9]+|[0-9]+)))"
     )
 
+    # The pattern is RE2 compatible, but the google-re2 bindings are much
+    # slower than the re module on these short, bounded matches.
+    ENERGY_LOG_REGEX: re.Pattern = re.compile(ENERGY_LOG_PATTERN, re.ASCII)
+
+    # Parse every raw energy log with ENERGY_LOG_REGEX, for bug-for-bug
+    # compatibility. By default well formed logs are parsed with string
+    # splitting and only the others are handed over to the regex.
+    USE_REGEX_PARSER: bool = False
+
     def __init__(self):
-        self._energy_consumption_logs: Dict[str, EnergyConsumptionLog] = dict()
+        self._energy_consumption_logs: Dict[
+            Tuple[float, float], EnergyConsumptionLog
+        ] = dict()
+        self._chronological_log_keys: List[Tuple[float, float]] = list()
+        self._sorted_logs_cache: Optional[List[EnergyConsumptionLog]] = None
 
     def add_log(self, raw_energy_log: str):
-        processed_energy_log = self._process_energy_log(raw_energy_log)
+        if self.USE_REGEX_PARSER:
+            energy_log = self._match_energy_log(raw_energy_log)
+        else:
+            energy_log = self._split_energy_log(raw_energy_log)
 
-        if not processed_energy_log:
+        if not energy_log:
             return
 
-        self._energy_consumption_logs.update(processed_energy_log)
+        log_key = (energy_log.timestamp, energy_log.delta_consumption)
+        if log_key not in self._energy_consumption_logs:
+            chronological_log_keys = self._chronological_log_keys
+            # Logs usually arrive in a chronological order, so try appending first
+            if not chronological_log_keys or log_key > chronological_log_keys[-1]:
+                chronological_log_keys.append(log_key)
+            else:
+                insort(chronological_log_keys, log_key)
+        self._energy_consumption_logs[log_key] = energy_log
+        self._sorted_logs_cache = None
 
     def batch_add_logs(self, raw_energy_logs: List[str]):
-        for raw_energy_log in raw_energy_logs:
-            self.add_log(raw_energy_log)
-
-    def _process_energy_log(
-        self, raw_energy_log: str
-    ) -> Dict[str, EnergyConsumptionLog]:
-        """Processes a raw energy log and returns a Dict mapping a
-        standardized raw energy log to EnergyConsumptionLog object"""
+        if self.USE_REGEX_PARSER:
+            # add_log only matches the first line of a raw energy log, so any
+            # further lines are cut off before the batch is joined
+            energy_logs = self._match_energy_logs(
+                "\n".join(
+                    [
+                        raw_energy_log
+                        if "\n" not in raw_energy_log
+                        else raw_energy_log.partition("\n")[0]
+                        for raw_energy_log in raw_energy_logs
+                    ]
+                )
+            )
+        else:
+            split_energy_log = self._split_energy_log
+            energy_logs = [
+                split_energy_log(raw_energy_log) for raw_energy_log in raw_energy_logs
+            ]
+
+        self._update_logs(
+            {
+                (energy_log.timestamp, energy_log.delta_consumption): energy_log
+                for energy_log in energy_logs
+                if energy_log
+            }
+        )
+
+    def _update_logs(
+        self, processed_energy_logs: Dict[Tuple[float, float], EnergyConsumptionLog]
+    ):
+        """Adds a batch of processed energy logs while keeping them in a
+        chronological order"""
+        new_log_keys = [
+            log_key
+            for log_key in processed_energy_logs
+            if log_key not in self._energy_consumption_logs
+        ]
+        self._energy_consumption_logs.update(processed_energy_logs)
+        self._sorted_logs_cache = None
+
+        if new_log_keys:
+            self._chronological_log_keys.extend(new_log_keys)
+            self._chronological_log_keys.sort()
+
+    def clear_logs(self):
+        """Removes all the energy consumption logs"""
+        self._energy_consumption_logs.clear()
+        self._chronological_log_keys.clear()
+        self._sorted_logs_cache = None
+
+    def _split_energy_log(self, raw_energy_log: str) -> EnergyConsumptionLog:
+        """Parses a well formed raw energy log, i.e. `<Unix epoch> TurnOff` or
+        `<Unix epoch> Delta <signed float>` separated by single spaces, using
+        plain string operations. Any other raw energy log is handed over to
+        _match_energy_log, so both parsers accept exactly the same logs."""
+        # Cheap check to reject malformed logs before splitting them
+        first_char = raw_energy_log[:1]
+        if not first_char.isdigit():
+            if first_char == ">":
+                return self._match_energy_log(raw_energy_log)
+            return
+
+        parts = raw_energy_log.split(" ")
+
+        if len(parts) in (2, 3) and raw_energy_log.isascii():
+            raw_timestamp = parts[0]
+            command = _ENERGY_LOG_COMMANDS.get(parts[1])
+
+            if len(raw_timestamp) <= 10 and raw_timestamp.isdigit():
+                # The validated digits are parsed once, straight into the
+                # stored float. float() is faster than int() for these strings.
+                if command == _TURN_OFF_COMMAND and len(parts) == 2:
+                    return EnergyConsumptionLog(
+                        timestamp=float(raw_timestamp), turned_on=False
+                    )
+
+                if command == _DELTA_COMMAND and len(parts) == 3:
+                    raw_delta = parts[2]
+                    # Well formed deltas are passed straight to float(). Any
+                    # trailing text, as in "+0.5123=====", is left to the regex
+                    integer, dot, fraction = raw_delta[1:].partition(".")
+                    if (
+                        raw_delta[:1] in ("+", "-")
+                        and integer.isdigit()
+                        and (fraction.isdigit() or not dot)
+                    ):
+                        return EnergyConsumptionLog(
+                            timestamp=float(raw_timestamp),
+                            delta_consumption=float(raw_delta),
+                        )
+
+        return self._match_energy_log(raw_energy_log)
+
+    def _match_energy_log(self, raw_energy_log: str) -> EnergyConsumptionLog:
+        """Parses a raw energy log using ENERGY_LOG_REGEX. Handles the raw
+        energy logs _split_energy_log can't, e.g. with a `>` prompt or other
+        whitespace, and all of them when USE_REGEX_PARSER is set."""
+        # Cheap checks to reject malformed logs before running the regex
+        first_char = raw_energy_log[:1]
+        if first_char != ">" and not first_char.isdigit():
+            return
+
+        if "Delta" not in raw_energy_log and "TurnOff" not in raw_energy_log:
+            return
+
         match_obj = self.ENERGY_LOG_REGEX.match(raw_energy_log)
 
         if not match_obj:
             return
 
-        m_groups = match_obj.groups()
+        timestamp = float(match_obj.group(1))
+        raw_delta_consumption = match_obj.group(2)
 
-        timestamp = datetime.fromtimestamp(float(m_groups[0]))
+        if raw_delta_consumption is None:
+            return EnergyConsumptionLog(timestamp=timestamp, turned_on=False)
 
-        if "TurnOff" in raw_energy_log:
-            energy_log = EnergyConsumptionLog(timestamp=timestamp, turned_on=False)
-        elif "Delta" in raw_energy_log:
-            delta_consumption = float(m_groups[-1])
-            energy_log = EnergyConsumptionLog(
-                timestamp=timestamp, delta_consumption=delta_consumption
-            )
-        else:
-            return
+        return EnergyConsumptionLog(
+            timestamp=timestamp, delta_consumption=float(raw_delta_consumption)
+        )
+
+    def _match_energy_logs(self, raw_energy_logs: str) -> List[EnergyConsumptionLog]:
+        """Parses newline separated raw energy logs with a single pass of
+        ENERGY_LOG_REGEX over the whole text."""
+        energy_logs = []
+
+        for match_obj in self.ENERGY_LOG_REGEX.finditer(raw_energy_logs):
+            timestamp = float(match_obj.group(1))
+            raw_delta_consumption = match_obj.group(2)
+
+            if raw_delta_consumption is None:
+                energy_log = EnergyConsumptionLog(timestamp=timestamp, turned_on=False)
+            else:
+                energy_log = EnergyConsumptionLog(
+                    timestamp=timestamp, delta_consumption=float(raw_delta_consumption)
+                )
+
+            energy_logs.append(energy_log)
 
-        return {str(energy_log): energy_log}
+        return energy_logs
 
     def get_logs(self) -> List[EnergyConsumptionLog]:
         """Returns the energy consumption logs in a chronological order"""
-        return [
-            self._energy_consumption_logs[timestamp]
-            for timestamp in sorted(self._energy_consumption_logs.keys())
-        ]
+        if self._sorted_logs_cache is None:
+            self._sorted_logs_cache = [
+                self._energy_consumption_logs[log_key]
+                for log_key in self._chronological_log_keys
+            ]
+
+        return list(self._sorted_logs_cache)
 
 
 class EnergyConsumer:
@@ -112,6 +324,13 @@ class EnergyConsumer:
             Used to log energy consumption for the consumer.
     """
 
+    __slots__ = (
+        "kind",
+        "max_consumption",
+        "current_consumption",
+        "energy_consumption_logger",
+    )
+
     def __init__(self, kind: str, max_consumption: float):
         if max_consumption < 0:
             raise ValueError(
@@ -125,22 +344,38 @@ class EnergyConsumer:
 
     def set_consumption(self, delta_change: float):
         """Sets the current energy consumption for the energy consumer by
-        passing a delta change augment the current value."""
-        if delta_change < 0:
-            self.current_consumption = max(0, self.current_consumption + delta_change)
-        elif delta_change > 0:
-            self.current_consumption = min(1, self.current_consumption + delta_change)
-        else:
-            self.current_consumption = 0
+        passing a delta change augment the current value. The value is
+        clamped between 0 and 1, and a delta change of 0 (TurnOff) sets it to 0."""
+        self.current_consumption = (
+            0.0
+            if delta_change == 0
+            else max(0.0, min(1.0, self.current_consumption + delta_change))
+        )
 
 
 class EnergyEstimator:
     """A class that estimates the energy used by an energy consumator in
     the course of a sequence of enery logs."""
 
+    # Minimum number of logs to estimate with the Numba kernel. Importing
+    # numba and compiling the kernel takes about 0.8s, which the kernel
+    # only wins back at around one and a half million logs.
+    NUMBA_MIN_LOGS: int = 1_500_000
+
     def estimate_energy(self, energy_consumer: EnergyConsumer) -> float:
         energy_logs = energy_consumer.energy_consumption_logger.get_logs()
 
+        if len(energy_logs) < self.NUMBA_MIN_LOGS or _load_numba_kernel() is None:
+            return self._estimate_energy_python(energy_consumer, energy_logs)
+
+        return self._estimate_energy_numba(energy_consumer, energy_logs)
+
+    def _estimate_energy_python(
+        self,
+        energy_consumer: EnergyConsumer,
+        energy_logs: List[EnergyConsumptionLog],
+    ) -> float:
+        """Estimates the energy used by iterating over consecutive logs"""
         total_energy_estimate = 0
 
         for current_log in range(len(energy_logs)):
@@ -149,12 +384,8 @@ class EnergyEstimator:
                 break
 
             hours_elapsed_between_logs = (
-                (
-                    energy_logs[next_log].timestamp - energy_logs[current_log].timestamp
-                ).total_seconds()
-                / 60
-                / 60
-            )
+                energy_logs[next_log].timestamp - energy_logs[current_log].timestamp
+            ) / 3600.0
 
             energy_consumer.set_consumption(energy_logs[current_log].delta_consumption)
 
@@ -166,19 +397,63 @@ class EnergyEstimator:
 
         return total_energy_estimate
 
+    def _estimate_energy_numba(
+        self,
+        energy_consumer: EnergyConsumer,
+        energy_logs: List[EnergyConsumptionLog],
+    ) -> float:
+        """Estimates the energy used with the Numba compiled kernel"""
+        import numpy as np
+
+        logs_count = len(energy_logs)
+
+        timestamps = np.fromiter(
+            (energy_log.timestamp for energy_log in energy_logs),
+            dtype=np.float64,
+            count=logs_count,
+        )
+        delta_consumptions = np.fromiter(
+            (energy_log.delta_consumption for energy_log in energy_logs),
+            dtype=np.float64,
+            count=logs_count,
+        )
+
+        (
+            total_energy_estimate,
+            energy_consumer.current_consumption,
+        ) = _load_numba_kernel()(
+            timestamps,
+            delta_consumptions,
+            float(energy_consumer.current_consumption),
+            float(energy_consumer.max_consumption),
+        )
+
+        return total_energy_estimate
+
 
 if __name__ == "__main__":
     lightbulb = EnergyConsumer(kind="lightbulb", max_consumption=5)
     energy_estimator = EnergyEstimator()
 
-    try:
-        while True:
-            line = input()
+    if sys.stdin.isatty():
+        try:
+            while True:
+                line = input()
+                if "EOF" in line:
+                    break
+                lightbulb.energy_consumption_logger.add_log(line)
+        except EOFError:
+            pass  # Handle Ctrl-D, etc.
+    else:
+        # Piped input is read in one go and added as a single batch
+        raw_energy_logs = (
+            sys.stdin.buffer.read().decode("ascii", errors="replace").splitlines()
+        )
+        for line_number, line in enumerate(raw_energy_logs):
             if "EOF" in line:
+                raw_energy_logs = raw_energy_logs[:line_number]
                 break
-            lightbulb.energy_consumption_logger.add_log(line)
-    except EOFError:
-        pass  # Handle Ctrl-D, etc.
+        lightbulb.energy_consumption_logger.batch_add_logs(raw_energy_logs)
 
     estimated_energy = energy_estimator.estimate_energy(lightbulb)
     print(f"Estimated energy used: {estimated_energy} Wh")
@@ -1,6 +1,12 @@
 from datetime import datetime
 
 import unittest
+from unittest import mock
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 from core import (
     EnergyConsumptionLog,
@@ -15,26 +21,32 @@ class TestEnergyConsumptionLog(unittest.TestCase):
         """Tests that an energy consumption log is created
         properly depending on the turned_on value and delta
         consumption."""
-        log = EnergyConsumptionLog(
+        log = EnergyConsumptionLog.from_datetime(
             timestamp=datetime(2023, 10, 17), delta_consumption=+0.53
         )
-        self.assertEqual(log.timestamp, datetime(2023, 10, 17))
+        self.assertEqual(log.timestamp, datetime(2023, 10, 17).timestamp())
         self.assertEqual(log.delta_consumption, +0.53)
         self.assertEqual(str(log), "1697497200.0:0.53")
 
-        log = EnergyConsumptionLog(
+        log = EnergyConsumptionLog.from_datetime(
             timestamp=datetime(2024, 2, 29), delta_consumption=-0.143
         )
-        self.assertEqual(log.timestamp, datetime(2024, 2, 29))
+        self.assertEqual(log.timestamp, datetime(2024, 2, 29).timestamp())
         self.assertEqual(log.delta_consumption, -0.143)
         self.assertEqual(str(log), "1709164800.0:-0.143")
 
-        log = EnergyConsumptionLog(
+        log = EnergyConsumptionLog.from_datetime(
             timestamp=datetime(2024, 2, 29), delta_consumption=-0.143, turned_on=False
         )
-        self.assertEqual(log.timestamp, datetime(2024, 2, 29))
+        self.assertEqual(log.timestamp, datetime(2024, 2, 29).timestamp())
         self.assertEqual(log.delta_consumption, 0)
-        self.assertEqual(str(log), "1709164800.0:0")
+        self.assertIsInstance(log.delta_consumption, float)
+        self.assertEqual(str(log), "1709164800.0:0.0")
+
+        log = EnergyConsumptionLog(timestamp=1544206563.0, delta_consumption=+0.5)
+        self.assertEqual(log.timestamp, 1544206563.0)
+        self.assertEqual(log.delta_consumption, +0.5)
+        self.assertEqual(str(log), "1544206563.0:0.5")
 
 
 class TestEnergyConsumptionLogger(unittest.TestCase):
@@ -47,29 +59,29 @@ class TestEnergyConsumptionLogger(unittest.TestCase):
 
         raw_log = "1544206563 Delta +0.5"
         logger.add_log(raw_log)
-        processed_log = logger._energy_consumption_logs["1544206563.0:0.5"]
-        self.assertEqual(processed_log.timestamp, datetime(2018, 12, 7, 18, 16, 3))
+        processed_log = logger._energy_consumption_logs[(1544206563.0, 0.5)]
+        self.assertEqual(processed_log.timestamp, 1544206563.0)
         self.assertEqual(processed_log.delta_consumption, +0.5)
 
         raw_log = "1544210163 Delta -0.5123"
         logger.add_log(raw_log)
-        processed_log = logger._energy_consumption_logs["1544210163.0:-0.5123"]
-        self.assertEqual(processed_log.timestamp, datetime(2018, 12, 7, 19, 16, 3))
+        processed_log = logger._energy_consumption_logs[(1544210163.0, -0.5123)]
+        self.assertEqual(processed_log.timestamp, 1544210163.0)
         self.assertEqual(processed_log.delta_consumption, -0.5123)
 
         raw_log = "1544210163      Delta     -05123"
         logger.add_log(raw_log)
-        processed_log = logger._energy_consumption_logs["1544210163.0:-5123.0"]
-        self.assertEqual(processed_log.timestamp, datetime(2018, 12, 7, 19, 16, 3))
+        processed_log = logger._energy_consumption_logs[(1544210163.0, -5123.0)]
+        self.assertEqual(processed_log.timestamp, 1544210163.0)
         self.assertEqual(processed_log.delta_consumption, -5123)
 
         raw_log = "1544210163 TurnOff"
         logger.add_log(raw_log)
-        processed_log = logger._energy_consumption_logs["1544210163.0:0"]
-        self.assertEqual(processed_log.timestamp, datetime(2018, 12, 7, 19, 16, 3))
+        processed_log = logger._energy_consumption_logs[(1544210163.0, 0.0)]
+        self.assertEqual(processed_log.timestamp, 1544210163.0)
         self.assertEqual(processed_log.delta_consumption, 0)
 
-        logger._energy_consumption_logs = dict()
+        logger.clear_logs()
         raw_log = "1544210163 TurnedOff"
         logger.add_log(raw_log)
         self.assertEqual(len(logger._energy_consumption_logs), 0)
@@ -82,6 +94,56 @@ class TestEnergyConsumptionLogger(unittest.TestCase):
         logger.add_log(raw_log)
         self.assertEqual(len(logger._energy_consumption_logs), 0)
 
+    def test_add_log_regex_fallback(self):
+        """Tests that raw energy logs which string splitting can't parse are
+        handed over to ENERGY_LOG_REGEX, so that the default parser accepts
+        the same raw energy logs as USE_REGEX_PARSER, whether added one by
+        one or as a batch."""
+        raw_logs = [
+            "1544206562 TurnOff",
+            "> 1544206563 Delta +0.5",
+            "1544210163      Delta     -05123",
+            "1544211963 Delta +0.5123=====",
+            "15442101634123123 Delta -0.25",
+            "1544213763 TurnedOff",
+            "1544213763 Delta TurnedOff",
+            "1544213764 Delta",
+            "+0.25",
+            "1544213765 Delta +.5",
+            "1544213766 Delta +0.75.5",
+            " 1544213767 TurnOff",
+            "1544213768\x0bTurnOff",
+            ">\t1544213769 TurnOff",
+            "1544213770 Delta +5.",
+            "junk\n1544213771 TurnOff",
+            "1544213772 TurnOff\njunk\n1544213773 TurnOff",
+            "1544213774\n1544213775 TurnOff",
+            "EOF",
+        ]
+        expected_logs = [
+            "1544206562.0:0.0",
+            "1544206563.0:0.5",
+            "1544210163.0:-5123.0",
+            "1544211963.0:0.5123",
+            "1544213766.0:0.75",
+            "1544213768.0:0.0",
+            "1544213769.0:0.0",
+            "1544213770.0:5.0",
+            "1544213772.0:0.0",
+        ]
+
+        for use_regex_parser in (False, True):
+            logger = EnergyConsumptionLogger()
+            logger.USE_REGEX_PARSER = use_regex_parser
+            for raw_log in raw_logs:
+                logger.add_log(raw_log)
+            self.assertListEqual([str(log) for log in logger.get_logs()], expected_logs)
+
+            logger = EnergyConsumptionLogger()
+            logger.USE_REGEX_PARSER = use_regex_parser
+            logger.batch_add_logs(raw_logs)
+            self.assertListEqual([str(log) for log in logger.get_logs()], expected_logs)
+
     def test_get_logs(self):
         """Tests that when provided with a sequence of raw energy logs
         the EnergyConsumptionLogger correctly processes those as EnergyConsumptionLog
@@ -101,14 +163,14 @@ class TestEnergyConsumptionLogger(unittest.TestCase):
         self.assertListEqual(
             [str(log) for log in logger.get_logs()],
             [
-                "1544206562.0:0",
+                "1544206562.0:0.0",
                 "1544206563.0:0.5",
                 "1544210163.0:-0.25",
                 "1544211963.0:0.75",
-                "1544213763.0:0",
+                "1544213763.0:0.0",
             ],
         )
-        logger._energy_consumption_logs = dict()
+        logger.clear_logs()
 
         for raw_log in [
             "1544206562 TurnOff",
@@ -131,13 +193,46 @@ class TestEnergyConsumptionLogger(unittest.TestCase):
         self.assertListEqual(
             [str(log) for log in logger.get_logs()],
             [
-                "1231231123.0:0",
-                "1544206562.0:0",
+                "1231231123.0:0.0",
+                "1544206562.0:0.0",
                 "1544206563.0:0.5",
                 "1544210163.0:-0.25",
                 "1544211963.0:0.5123",
             ],
         )
+        logger.clear_logs()
+
+        # Timestamps with a different number of digits
+        for raw_log in [
+            "1000000000 TurnOff",
+            "999999999 Delta +0.5",
+        ]:
+            logger.add_log(raw_log)
+
+        self.assertListEqual(
+            [str(log) for log in logger.get_logs()],
+            ["999999999.0:0.5", "1000000000.0:0.0"],
+        )
+        logger.clear_logs()
+
+        # Logs with the same timestamp are ordered by their delta consumption
+        for raw_log in [
+            "1544206563 Delta +0.5",
+            "1544206563 Delta -0.25",
+            "1544206563 TurnOff",
+            "1544206563 Delta -10",
+        ]:
+            logger.add_log(raw_log)
+
+        self.assertListEqual(
+            [str(log) for log in logger.get_logs()],
+            [
+                "1544206563.0:-10.0",
+                "1544206563.0:-0.25",
+                "1544206563.0:0.0",
+                "1544206563.0:0.5",
+            ],
+        )
 
 
 class TestEnergyConsumer(unittest.TestCase):
@@ -234,7 +329,7 @@ class TestEnergyEstimator(unittest.TestCase):
         )
         estimated_energy = energy_estimator.estimate_energy(lightbulb)
         self.assertEqual(estimated_energy, 0.0)
-        lightbulb.energy_consumption_logger._energy_consumption_logs = dict()
+        lightbulb.energy_consumption_logger.clear_logs()
 
         lightbulb.energy_consumption_logger.batch_add_logs(
             [
@@ -245,6 +340,55 @@ class TestEnergyEstimator(unittest.TestCase):
         estimated_energy = energy_estimator.estimate_energy(lightbulb)
         self.assertEqual(estimated_energy, 0.0)
 
+    @unittest.skipUnless(numba, "numba is not installed")
+    def test_estimate_energy_numba(self):
+        """Tests that the Numba compiled estimation gives the same energy
+        estimate and final consumption as the pure Python estimation."""
+        energy_estimator = EnergyEstimator()
+        raw_logs = [
+            "1544206562 Delta -0.25",
+            "1544206563 Delta +0.5",
+            "1544210163 Delta -0.25",
+            "1544210163 Delta -0.75",
+            "1544211963 Delta +5",
+            "1544212000 TurnOff",
+            "1544213763 Delta +0.125",
+            "1544215000 Delta -0.5",
+            "1544216000 Delta +0.3",
+            "1544217000 Delta +0.25",
+        ]
+
+        python_lightbulb = EnergyConsumer(kind="lightbulb", max_consumption=5)
+        python_lightbulb.energy_consumption_logger.batch_add_logs(raw_logs)
+        python_estimate = energy_estimator._estimate_energy_python(
+            python_lightbulb, python_lightbulb.energy_consumption_logger.get_logs()
+        )
+
+        numba_lightbulb = EnergyConsumer(kind="lightbulb", max_consumption=5)
+        numba_lightbulb.energy_consumption_logger.batch_add_logs(raw_logs)
+        numba_estimate = energy_estimator._estimate_energy_numba(
+            numba_lightbulb, numba_lightbulb.energy_consumption_logger.get_logs()
+        )
+
+        self.assertAlmostEqual(numba_estimate, python_estimate)
+        self.assertAlmostEqual(
+            numba_lightbulb.current_consumption, python_lightbulb.current_consumption
+        )
+        self.assertAlmostEqual(numba_lightbulb.current_consumption, 0.3)
+
+        # estimate_energy uses the kernel from NUMBA_MIN_LOGS logs up
+        lightbulb = EnergyConsumer(kind="lightbulb", max_consumption=5)
+        lightbulb.energy_consumption_logger.batch_add_logs(raw_logs)
+        energy_estimator.NUMBA_MIN_LOGS = len(raw_logs)
+        with mock.patch.object(
+            energy_estimator,
+            "_estimate_energy_numba",
+            wraps=energy_estimator._estimate_energy_numba,
+        ) as estimate_energy_numba:
+            estimated_energy = energy_estimator.estimate_energy(lightbulb)
+        estimate_energy_numba.assert_called_once()
+        self.assertAlmostEqual(estimated_energy, python_estimate)
+
 
 if __name__ == "__main__":
     unittest.main()